@@ -0,0 +1,497 @@
+r"""
+.. role:: html(raw)
+   :format: html
+
+Generalization in QML from few training data
+============================================
+
+.. meta::
+    :property="og:description": Train a quantum convolutional neural network to classify
+        handwritten digits and study how its generalization improves with the training set size.
+    :property="og:image": https://pennylane.ai/qml/_static/demos_card.png
+
+.. related::
+
+   tutorial_variational_classifier Variational classifier
+   tutorial_data_reuploading_classifier Data-reuploading classifier
+   tutorial_local_cost_functions Alleviating barren plateaus with local cost functions
+
+*Author: PennyLane dev team. Last updated: 15 Aug 2022.*
+
+How many training samples does a quantum machine learning model need before it
+generalizes to unseen data? Recent theoretical work by
+`Caro et al. (2022) <https://arxiv.org/abs/2111.05292>`__ shows that the
+generalization error of a variational quantum model with :math:`T` trainable
+gates scales roughly as :math:`\sqrt{T / N}`, where :math:`N` is the size of the
+training set. In other words, surprisingly few samples can suffice when the
+circuit is shallow.
+
+In this tutorial we put this prediction to the test. We train a *quantum
+convolutional neural network* (QCNN) — introduced by
+`Cong, Choi, and Lukin (2019) <https://arxiv.org/abs/1810.03787>`__ — to
+distinguish handwritten digits from the scikit-learn digits dataset, and track
+how the gap between training and testing accuracy shrinks as we increase the
+number of training samples.
+
+Throughout, we use JAX to compile and differentiate the full training step, so
+that repeating the experiment over many training-set sizes and random seeds
+remains cheap.
+"""
+
+##############################################################################
+# Loading the data
+# ----------------
+#
+# We begin with the usual imports. The quantum circuit is built with PennyLane,
+# while JAX traces and compiles the classical training loop around it, with
+# `optax <https://github.com/deepmind/optax>`__ providing the optimizer.
+
+from functools import lru_cache, partial
+
+import matplotlib.pyplot as plt
+import numpy as np
+import pandas as pd
+import seaborn as sns
+from sklearn import datasets
+
+import jax
+import jax.numpy as jnp
+import optax
+
+import pennylane as qml
+
+sns.set()
+
+seed = 0
+rng = np.random.default_rng(seed=seed)
+
+##############################################################################
+# We restrict ourselves to a binary problem — distinguishing the digits 0 and
+# 1 — so that a single output qubit suffices. Each :math:`8\times 8` image is
+# flattened into a 64-dimensional feature vector and normalized. Since
+# :math:`64 = 2^6`, each normalized vector *is* already a valid six-qubit
+# state, so we can later load it into the simulator directly instead of
+# synthesizing a state-preparation circuit for it. The training and testing
+# sets are subsampled at random without overlap.
+
+
+def load_digits_data(num_train, num_test, rng):
+    """Return a randomly subsampled train/test split of the 0-vs-1 digits data."""
+    digits = datasets.load_digits()
+    features, labels = digits.data, digits.target
+
+    # only use first two classes
+    mask = (labels == 0) | (labels == 1)
+    features, labels = features[mask], labels[mask]
+
+    # normalize all samples at once
+    features = features / np.linalg.norm(features, axis=1, keepdims=True)
+
+    # subsample disjoint train and test splits from one permutation
+    permutation = rng.permutation(len(labels))
+    train_indices = permutation[:num_train]
+    test_indices = permutation[num_train : num_train + num_test]
+
+    x_train, y_train = features[train_indices], labels[train_indices]
+    x_test, y_test = features[test_indices], labels[test_indices]
+
+    return (
+        jnp.asarray(x_train),
+        jnp.asarray(y_train, dtype=jnp.int32),
+        jnp.asarray(x_test),
+        jnp.asarray(y_test, dtype=jnp.int32),
+    )
+
+
+##############################################################################
+# Building the QCNN
+# -----------------
+#
+# The QCNN alternates between *convolutional* layers — a brickwork of
+# two-qubit kernels sharing the same 15 weights — and *pooling* layers, which
+# let half of the qubits control a rotation on their neighbours before being
+# discarded, halving the register at each step.
+
+
+@lru_cache
+def brickwork_pairs(wires):
+    """Return the qubit pairs of the even- and odd-offset brickwork sublayers.
+
+    The pattern only depends on the wires of the layer, so it is computed once
+    per register size and cached, keeping index arithmetic out of the traced
+    circuit function.
+    """
+    return tuple(
+        tuple((wires[indx], wires[indx + 1]) for indx in range(p, len(wires) - 1, 2))
+        for p in [0, 1]
+    )
+
+
+def ising_matrix(theta_x, theta_y, theta_z):
+    """Matrix of ``IsingZZ(theta_z) IsingYY(theta_y) IsingXX(theta_x)``.
+
+    The three Ising rotations commute, so their product has a closed form: it
+    acts as an X rotation by ``theta_x - theta_y`` on the :math:`\\{|00\\rangle,
+    |11\\rangle\\}` block and by ``theta_x + theta_y`` on the
+    :math:`\\{|01\\rangle, |10\\rangle\\}` block, with opposite ZZ phases.
+    """
+    a = (theta_x - theta_y) / 2
+    b = (theta_x + theta_y) / 2
+    p = jnp.exp(-0.5j * theta_z)
+    q = jnp.exp(0.5j * theta_z)
+    z = jnp.zeros_like(p)
+    return jnp.array(
+        [
+            [p * jnp.cos(a), z, z, -1j * p * jnp.sin(a)],
+            [z, q * jnp.cos(b), -1j * q * jnp.sin(b), z],
+            [z, -1j * q * jnp.sin(b), q * jnp.cos(b), z],
+            [-1j * p * jnp.sin(a), z, z, p * jnp.cos(a)],
+        ]
+    )
+
+
+def convolutional_layer(weights, wires, skip_first_layer=True):
+    """Adds a convolutional layer to the circuit.
+
+    Args:
+        weights (np.array): 1D array with 15 weights of the parametrized gates.
+        wires (list[int]): Wires where the convolutional layer acts on.
+        skip_first_layer (bool): Skips the first two single-qubit gates.
+    """
+    assert len(wires) >= 3, "this circuit is too small!"
+    even_pairs, odd_pairs = brickwork_pairs(tuple(wires))
+
+    # all kernels of the layer share their weights, so the fused two-qubit
+    # interaction matrix is computed once and reused on every pair
+    ising_block = ising_matrix(weights[6], weights[7], weights[8])
+
+    for pairs, first_sublayer in [(even_pairs, True), (odd_pairs, False)]:
+        for w, w_next in pairs:
+            if first_sublayer and not skip_first_layer:
+                qml.U3(*weights[:3], wires=[w])
+                qml.U3(*weights[3:6], wires=[w_next])
+            qml.QubitUnitary(ising_block, wires=[w, w_next])
+            qml.U3(*weights[9:12], wires=[w])
+            qml.U3(*weights[12:], wires=[w_next])
+
+
+def pooling_layer(weights, wires):
+    """Adds a pooling layer to the circuit.
+
+    Every odd wire controls a U3 rotation on its even neighbour and is then
+    dropped from the register. By the deferred measurement principle this
+    controlled gate is equivalent to measuring the odd wire and applying the
+    rotation conditioned on the outcome — but it keeps the circuit
+    deterministic, so no mid-circuit measurement machinery is needed.
+
+    Args:
+        weights (np.array): Array with the weights of the conditional U3 gate.
+        wires (list[int]): List of wires to apply the pooling layer on.
+    """
+    n_wires = len(wires)
+    assert len(wires) >= 2, "this circuit is too small!"
+
+    for indx, w in enumerate(wires):
+        if indx % 2 == 1 and indx < n_wires:
+            qml.ctrl(qml.U3, control=w)(*weights, wires=wires[indx - 1])
+
+
+def conv_and_pooling(kernel_weights, n_wires, skip_first_layer=True):
+    """Apply one convolutional layer followed by one pooling layer."""
+    convolutional_layer(kernel_weights[:15], n_wires, skip_first_layer=skip_first_layer)
+    pooling_layer(kernel_weights[15:], n_wires)
+
+
+def dense_layer(weights, wires):
+    """Apply an arbitrary unitary gate to a specified set of wires."""
+    qml.ArbitraryUnitary(weights, wires)
+
+
+num_wires = 6
+num_layers = 2
+
+# every pooling layer keeps the even-indexed wires of its register, so the
+# registers seen by each layer — and with them the size of the dense head —
+# are fixed by the architecture. Precompute them once instead of re-slicing
+# wires[::2] and re-deriving sizes inside the traced circuit.
+layer_wires = [tuple(range(num_wires))]
+for _ in range(num_layers):
+    layer_wires.append(layer_wires[-1][::2])
+layer_wires = tuple(layer_wires)
+
+num_dense_wires = len(layer_wires[-1])
+num_dense_params = 4**num_dense_wires - 1
+
+# a single-precision state vector is plenty for six qubits and a sampled cost,
+# and it matches JAX's default float32/complex64 types, halving memory traffic
+# and avoiding silent up- and downcasts at the QNode boundary
+device = qml.device(
+    "default.qubit", wires=num_wires, r_dtype=np.float32, c_dtype=np.complex64
+)
+
+##############################################################################
+# .. note::
+#
+#     We simulate on ``default.qubit`` because its pure-JAX backpropagation
+#     path is what lets us trace, broadcast and jit-compile the whole training
+#     step below. If you run this circuit outside of a jitted JAX pipeline —
+#     or scale it to more qubits, where Python-per-gate dispatch stops being
+#     the bottleneck — swap in the C++ simulator instead:
+#
+#     .. code-block:: python
+#
+#         device = qml.device("lightning.qubit", wires=num_wires)
+#
+#     together with ``diff_method="adjoint"`` on the QNode, which computes
+#     gradients in a single forward-backward sweep of the state vector.
+#
+#     Beyond a few dozen qubits, state-vector simulation stops being an
+#     option altogether. QCNNs are then a particularly grateful target for
+#     tensor-network simulators: the output probability only depends on the
+#     shallow causal cone of the measured qubit, so contracting the circuit
+#     as a tensor network with an optimized contraction path touches far less
+#     than the full Hilbert space. At the six qubits used here, the batched
+#     ``einsum`` contractions XLA compiles for us are already the optimal
+#     form of that idea.
+
+
+@qml.qnode(device, interface="jax")
+def conv_net(weights, last_layer_weights, features):
+    """Define the QCNN circuit.
+
+    Args:
+        weights (np.array): Parameters of the convolution and pool layers.
+        last_layer_weights (np.array): Parameters of the last dense layer.
+        features (np.array): Input data to be embedded in the circuit. A
+            leading batch dimension is broadcast over by the device.
+    """
+    # load the normalized feature vector directly as the initial state; on
+    # default.qubit this is an array assignment, whereas AmplitudeEmbedding
+    # would decompose into O(2^n) gates on every single forward pass
+    qml.QubitStateVector(features, wires=layer_wires[0])
+    qml.Barrier(wires=layer_wires[0], only_visual=True)
+
+    # adds convolutional and pooling layers
+    for j in range(num_layers):
+        conv_and_pooling(weights[:, j], layer_wires[j], skip_first_layer=(not j == 0))
+        qml.Barrier(wires=layer_wires[j + 1], only_visual=True)
+
+    dense_layer(last_layer_weights, layer_wires[-1])
+    return qml.probs(wires=(0))
+
+
+##############################################################################
+# Let us have a look at the circuit for a single image before training it.
+
+example_state = np.random.rand(2**num_wires)
+example_state = example_state / np.linalg.norm(example_state)
+
+fig, ax = qml.draw_mpl(conv_net)(
+    np.random.rand(18, num_layers), np.random.rand(num_dense_params), example_state
+)
+plt.show()
+
+##############################################################################
+# Training the network
+# --------------------
+#
+# The cost function is based on the probability of measuring the correct label
+# on the first qubit: we maximize the summed label probabilities over the
+# batch. The accuracy simply counts how often that probability exceeds
+# :math:`1/2`.
+#
+# Rather than vectorizing the QNode over samples with ``jax.vmap``, we pass the
+# whole batch of state vectors to ``qml.QubitStateVector`` at once and rely
+# on ``default.qubit``'s native parameter broadcasting: the simulator carries
+# the batch as an extra leading axis of the state tensor and applies each gate
+# matrix once across it, instead of evolving the state vector sample by sample.
+#
+# Since the batched output is reused by every cost and accuracy evaluation, we
+# jit it once at definition time — the tape construction triggered by tracing
+# the QNode then only happens on the first call (and whenever the batch shape
+# changes), instead of on every epoch.
+
+
+@jax.jit
+def compute_out(weights, weights_last, features, labels):
+    """Computes the output of the corresponding label in the qcnn."""
+    probs = conv_net(weights, weights_last, features)
+    return jnp.take_along_axis(probs, labels[:, None], axis=1)[:, 0]
+
+
+@jax.jit
+def compute_metrics(weights, weights_last, features, labels):
+    """Computes cost and accuracy jointly from one batched circuit evaluation."""
+    out = compute_out(weights, weights_last, features, labels)
+    cost = 1.0 - jnp.sum(out) / len(labels)
+    accuracy = jnp.sum(out > 0.5) / len(out)
+    return cost, accuracy
+
+
+def init_weights():
+    """Initializes random weights for the QCNN model."""
+    weights = rng.normal(loc=0, scale=1, size=(18, num_layers))
+    weights_last = rng.normal(loc=0, scale=1, size=num_dense_params)
+    return jnp.array(weights), jnp.array(weights_last)
+
+
+##############################################################################
+# For the training loop itself we lean on JAX: cost, gradient and the optax
+# Adam update are fused into a single jitted ``train_step``, so one epoch is a
+# single XLA-compiled call rather than a chain of Python dispatches. Both the
+# optimizer and the step live at module scope — since we will train the same
+# model many times over below, this lets every run with the same batch shapes
+# reuse the already-compiled step instead of tracing a fresh closure.
+#
+# The epochs themselves are driven by ``jax.lax.scan`` rather than a Python
+# ``for`` loop: the whole training run becomes one compiled program, and the
+# per-epoch metrics come back as stacked arrays instead of being appended to
+# lists one host round-trip at a time. Like ``num_wires`` and ``num_layers``,
+# the number of epochs is a compile-time constant — it fixes the scan length —
+# so it is declared static via ``functools.partial`` around ``jax.jit``. The
+# histories of all runs are collected in a ``pandas.DataFrame`` below.
+
+optimizer = optax.adam(learning_rate=0.01)
+
+
+@jax.jit
+def train_step(params, opt_state, features, labels):
+    """Fused cost, gradient and parameter update for one epoch.
+
+    The training accuracy rides along as an auxiliary output of the same
+    circuit evaluation that produces the gradient, so it costs nothing extra.
+    """
+    (loss, acc), grads = jax.value_and_grad(
+        lambda p: compute_metrics(p[0], p[1], features, labels), has_aux=True
+    )(params)
+    updates, opt_state = optimizer.update(grads, opt_state)
+    params = optax.apply_updates(params, updates)
+    return params, opt_state, loss, acc
+
+
+@partial(jax.jit, static_argnames="n_epochs")
+def train_run(params, opt_state, x_train, y_train, x_test, y_test, n_epochs):
+    """Execute a full training run as one compiled scan over the epochs.
+
+    The test metrics of different epochs are independent of one another, so
+    instead of interleaving a test sweep into every epoch, the scan records
+    the parameter history and all test evaluations run afterwards as a single
+    sweep batched over epochs *and* samples.
+    """
+
+    def epoch(carry, _):
+        params, opt_state = carry
+        params, opt_state, train_cost, train_acc = train_step(
+            params, opt_state, x_train, y_train
+        )
+        return (params, opt_state), (params, train_cost, train_acc)
+
+    _, (params_hist, train_cost, train_acc) = jax.lax.scan(
+        epoch, (params, opt_state), None, length=n_epochs
+    )
+
+    # compute accuracy and cost on testing data for every epoch at once
+    test_cost, test_acc = jax.vmap(compute_metrics, in_axes=(0, 0, None, None))(
+        params_hist[0], params_hist[1], x_test, y_test
+    )
+
+    return train_cost, train_acc, test_cost, test_acc
+
+
+##############################################################################
+# To see how generalization improves with more data, we repeat the training
+# for several training-set sizes, averaging each size over a few random
+# train/test splits and weight initializations. The repetitions are entirely
+# independent and share every array shape, so instead of looping over them on
+# the host (or reserving one device per repetition with ``jax.pmap``), we
+# stack their initial weights and data splits along a leading axis and train
+# all of them simultaneously with a vmapped ``train_run`` — XLA then spreads
+# the batched contractions across the available CPU cores.
+
+n_test = 100
+n_epochs = 100
+n_reps = 10
+
+
+def run_iterations(n_train):
+    """Train ``n_reps`` independent QCNNs on ``n_train`` samples in parallel.
+
+    Args:
+        n_train (int): number of training samples per repetition
+
+    Returns:
+        dict[str, np.ndarray]: costs and accuracies of every repetition and epoch
+    """
+    splits = [load_digits_data(n_train, n_test, rng) for _ in range(n_reps)]
+    x_train, y_train, x_test, y_test = map(jnp.stack, zip(*splits))
+
+    inits = [init_weights() for _ in range(n_reps)]
+    params = tuple(map(jnp.stack, zip(*inits)))
+    opt_state = jax.vmap(optimizer.init)(params)
+
+    train_cost, train_acc, test_cost, test_acc = jax.vmap(
+        partial(train_run, n_epochs=n_epochs)
+    )(params, opt_state, x_train, y_train, x_test, y_test)
+
+    return {
+        "n_train": np.full(n_reps * n_epochs, n_train),
+        "step": np.tile(np.arange(1, n_epochs + 1, dtype=int), n_reps),
+        "train_cost": np.asarray(train_cost).ravel(),
+        "train_acc": np.asarray(train_acc).ravel(),
+        "test_cost": np.asarray(test_cost).ravel(),
+        "test_acc": np.asarray(test_acc).ravel(),
+    }
+
+
+train_sizes = [2, 5, 10, 20, 40, 80]
+results = [run_iterations(n_train=n_train) for n_train in train_sizes]
+
+##############################################################################
+# Results
+# -------
+#
+# Only now, with all training done, do we hand the collected arrays over to
+# pandas: a single ``DataFrame`` built once for the analysis, instead of one
+# per run concatenated inside the training loop. We plot the averaged learning
+# curves for each training-set size, together with the generalization gap —
+# the difference between training and testing accuracy — at the end of
+# training.
+
+results_df = pd.DataFrame(
+    {key: np.concatenate([res[key] for res in results]) for key in results[0]}
+)
+
+fig, axes = plt.subplots(ncols=2, figsize=(11, 4))
+
+for n_train in train_sizes:
+    df = results_df[results_df.n_train == n_train]
+    curve = df.groupby("step").mean()
+    axes[0].plot(curve.index, curve.test_cost, label=f"N={n_train}")
+
+axes[0].set_xlabel("epoch")
+axes[0].set_ylabel("test cost")
+axes[0].legend()
+
+final = results_df[results_df.step == n_epochs].groupby("n_train").mean()
+axes[1].plot(final.index, final.train_acc - final.test_acc, "o--")
+axes[1].set_xlabel("training set size N")
+axes[1].set_ylabel("generalization gap")
+
+plt.tight_layout()
+plt.show()
+
+##############################################################################
+# As predicted by the :math:`\sqrt{T/N}` bound, the gap between training and
+# testing accuracy closes quickly as the training set grows: a few tens of
+# samples already suffice for the QCNN to generalize well on this task.
+#
+# References
+# ----------
+#
+# 1. Matthias C. Caro, Hsin-Yuan Huang, M. Cerezo, Kunal Sharma, Andrew
+#    Sornborger, Lukasz Cincio, Patrick J. Coles. "Generalization in quantum
+#    machine learning from few training data".
+#    `arXiv:2111.05292 <https://arxiv.org/abs/2111.05292>`__ (2021).
+#
+# 2. Iris Cong, Soonwon Choi, Mikhail D. Lukin. "Quantum Convolutional Neural
+#    Networks". `arXiv:1810.03787 <https://arxiv.org/abs/1810.03787>`__ (2019).